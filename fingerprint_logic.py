@@ -1,9 +1,16 @@
 import os
+import io
 import glob
+import math
+import shutil
+import struct
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 import librosa
 import numpy as np
 import datetime # NEW: To get the current date
-from scipy.ndimage import maximum_filter
+from scipy.signal import get_window, resample_poly, stft
+import soundfile as sf
 import argparse
 import psycopg2             # NEW: Use psycopg2 for PostgreSQL
 import uuid                 # NEW: To generate unique varchar IDs for songs
@@ -11,6 +18,9 @@ from dotenv import load_dotenv # NEW: To load secrets from .env file
 import uuid
 from datetime import datetime
 from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+import numba
+from numba import njit, prange
 
 
 # --- Database Setup ---
@@ -18,83 +28,307 @@ from psycopg2.extras import execute_values
 load_dotenv()
 DB_URL = os.getenv("DATABASE_URL")
 
+# One pool per process. It is created lazily (and recreated after a fork),
+# so forked Celery workers never share the parent's sockets.
+_POOL = None
+_POOL_PID = None
+_POOL_MAXCONN = 8
+
+def _get_pool():
+    global _POOL, _POOL_PID
+    if _POOL is None or _POOL_PID != os.getpid():
+        _POOL = ThreadedConnectionPool(1, _POOL_MAXCONN, DB_URL)
+        _POOL_PID = os.getpid()
+    return _POOL
+
 def connect_to_db():
-    """Establishes a connection to the Supabase PostgreSQL database."""
+    """Checks out a connection to the Supabase PostgreSQL database from the pool.
+
+    Pooled connections can be closed by the server while idle, so each one
+    is pinged before it is handed out. The ping runs in autocommit mode,
+    so it costs a single round trip instead of BEGIN/SELECT/ROLLBACK.
+    Dead connections are discarded and replaced; at most the whole pool
+    plus one fresh connection is tried.
+    """
     try:
-        conn = psycopg2.connect(DB_URL)
-        print("Database connection successful.")
-        return conn
-    except psycopg2.OperationalError as e:
+        pool = _get_pool()
+        for _ in range(_POOL_MAXCONN + 1):
+            conn = pool.getconn()
+            if not conn.closed:
+                try:
+                    conn.autocommit = True
+                    with conn.cursor() as cursor:
+                        cursor.execute("SELECT 1")
+                    conn.autocommit = False
+                    print("Database connection successful.")
+                    return conn
+                except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                    pass
+            pool.putconn(conn, close=True)
+        raise psycopg2.OperationalError("no live connection available from the pool")
+    except (psycopg2.OperationalError, psycopg2.pool.PoolError) as e:
         print(f"🔥 Could not connect to the database: {e}")
         print("Please check your DATABASE_URL in the .env file.")
         return None
 
-def fingerprint_song(file_path):
+def release_db(conn):
+    """Returns a connection obtained from `connect_to_db` to the pool."""
+    _get_pool().putconn(conn)
+
+# --- Fingerprinting Parameters ---
+# Every song is analysed at the same rate and frame layout, so the
+# derived tables are computed once per process instead of once per song.
+TARGET_SR = 11025
+N_FFT = 2048
+HOP_LENGTH = 512
+STFT_WINDOW = get_window('hann', N_FFT).astype(np.float32)
+
+TARGET_ZONE_START_TIME = 0.1
+TARGET_ZONE_TIME_DURATION = 0.8
+TARGET_ZONE_FREQ_WIDTH = 200
+
+# The same target zone and hash quantization in whole frames / FFT bins, so
+# the pairing kernel never touches a float.
+ZONE_MIN_FRAMES = math.ceil(TARGET_ZONE_START_TIME * TARGET_SR / HOP_LENGTH)
+ZONE_MAX_FRAMES = math.floor((TARGET_ZONE_START_TIME + TARGET_ZONE_TIME_DURATION) * TARGET_SR / HOP_LENGTH)
+ZONE_MAX_BINS = math.floor(TARGET_ZONE_FREQ_WIDTH * N_FFT / TARGET_SR)
+FREQ_CODES = np.arange(N_FFT // 2 + 1, dtype=np.int64) * 1023 // (N_FFT // 2)  # bin -> 10-bit code
+DT_CODES = np.arange(ZONE_MAX_FRAMES + 1, dtype=np.int64) * HOP_LENGTH * 100 // TARGET_SR  # frames -> 10 ms steps
+
+# --- Fingerprinting Kernels ---
+@njit(parallel=True, cache=True)
+def _find_peaks(S_db, foot=15, thr=-50.0):
+    """
+    Finds the spectrogram peaks in one fused pass.
+
+    A bin is a peak if it is louder than `thr` and no bin in the
+    `foot` x `foot` neighbourhood around it is louder. Bins outside the
+    spectrogram count as 0 dB, like `maximum_filter(..., mode='constant')`.
+    Returns the (row, column) indices of the peaks in row-major order, the
+    same as `np.where`.
+    """
+    n_rows, n_cols = S_db.shape
+    half = foot // 2
+    is_peak = np.zeros((n_rows, n_cols), dtype=np.bool_)
+    counts = np.zeros(n_rows, dtype=np.int64)
+
+    for r in prange(n_rows):
+        r_lo = max(r - half, 0)
+        r_hi = min(r + half + 1, n_rows)
+        c_row = 0
+        for c in range(n_cols):
+            v = S_db[r, c]
+            # Most bins fail the threshold, so their neighbourhood is never read.
+            if v <= thr:
+                continue
+            c_lo = max(c - half, 0)
+            c_hi = min(c + half + 1, n_cols)
+            touches_edge = (r_lo != r - half or r_hi != r + half + 1
+                            or c_lo != c - half or c_hi != c + half + 1)
+            if touches_edge and v < 0.0:
+                continue
+            peak = True
+            for rr in range(r_lo, r_hi):
+                for cc in range(c_lo, c_hi):
+                    if S_db[rr, cc] > v:
+                        peak = False
+                        break
+                if not peak:
+                    break
+            if peak:
+                is_peak[r, c] = True
+                c_row += 1
+        counts[r] = c_row
+
+    offsets = np.zeros(n_rows + 1, dtype=np.int64)
+    for r in range(n_rows):
+        offsets[r + 1] = offsets[r] + counts[r]
+
+    rows = np.empty(offsets[n_rows], dtype=np.int32)
+    cols = np.empty(offsets[n_rows], dtype=np.int32)
+    for r in prange(n_rows):
+        k = offsets[r]
+        for c in range(n_cols):
+            if is_peak[r, c]:
+                rows[k] = r
+                cols[k] = c
+                k += 1
+    return rows, cols
+
+@njit(parallel=True, cache=True)
+def _pair_peaks(frames, bins, dt_min, dt_max, df_max, freq_codes, dt_codes):
+    """
+    Pairs every anchor peak with the peaks inside its target zone.
+
+    Works entirely on integers: `frames` (STFT frame index, sorted
+    ascending) and `bins` (FFT bin index) of each peak. A target lies
+    `dt_min`..`dt_max` frames after its anchor and at most `df_max` bins
+    above or below it. Returns the packed hash of every (anchor, target)
+    pair together with the index of its anchor peak.
+
+    Hash layout (32 bits, deterministic across processes):
+        bits 22-31  anchor frequency code, `freq_codes[bin]` (10 bits)
+        bits 12-21  target frequency code, same table
+        bits  0-11  time delta code, `dt_codes[frames]` (10 ms steps)
+    """
+    n = frames.shape[0]
+
+    # Target zone of each anchor as an index range [lo, hi). Both bounds
+    # only move forward because the peaks are sorted by frame.
+    lo = np.empty(n, dtype=np.int64)
+    hi = np.empty(n, dtype=np.int64)
+    j_lo = 0
+    j_hi = 0
+    for i in range(n):
+        t_min = frames[i] + dt_min
+        t_max = frames[i] + dt_max
+        while j_lo < n and frames[j_lo] < t_min:
+            j_lo += 1
+        if j_hi < j_lo:
+            j_hi = j_lo
+        while j_hi < n and frames[j_hi] <= t_max:
+            j_hi += 1
+        lo[i] = j_lo
+        hi[i] = j_hi
+
+    # First pass counts the matches per anchor so the output can be
+    # preallocated and filled in parallel by the second pass.
+    counts = np.zeros(n, dtype=np.int64)
+    for i in prange(n):
+        c = 0
+        for j in range(lo[i], hi[i]):
+            if abs(np.int32(bins[j]) - np.int32(bins[i])) <= df_max:
+                c += 1
+        counts[i] = c
+
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    for i in range(n):
+        offsets[i + 1] = offsets[i] + counts[i]
+
+    hashes = np.empty(offsets[n], dtype=np.int64)
+    anchors = np.empty(offsets[n], dtype=np.int64)
+    for i in prange(n):
+        k = offsets[i]
+        f1 = freq_codes[bins[i]] << 22
+        for j in range(lo[i], hi[i]):
+            if abs(np.int32(bins[j]) - np.int32(bins[i])) <= df_max:
+                hashes[k] = f1 | (freq_codes[bins[j]] << 12) | dt_codes[frames[j] - frames[i]]
+                anchors[k] = i
+                k += 1
+    return hashes, anchors
+
+def warm_up_kernels():
+    """
+    Compiles the numba kernels, or loads them from the on-disk cache
+    (`cache=True`), so the first song a worker processes doesn't pay the
+    JIT latency. The cache lives in `__pycache__/`, which is not deployed:
+    the first call on a fresh machine compiles cold and takes a few
+    seconds; later processes load the cache in well under a second.
+
+    Call this once per worker process *after* it has been forked: running
+    a parallel kernel starts numba's thread pool, which must not be
+    inherited across a fork. The argument types match the real calls, so
+    no further specializations get compiled later.
+    """
+    _find_peaks(np.zeros((8, 8), dtype=np.float32), 15, -50.0)
+    _pair_peaks(np.zeros(1, dtype=np.int32), np.zeros(1, dtype=np.int16),
+                ZONE_MIN_FRAMES, ZONE_MAX_FRAMES, ZONE_MAX_BINS, FREQ_CODES, DT_CODES)
+
+# RAM-backed scratch space for decoders that need a real file.
+SCRATCH_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+def load_audio(audio_file, target_sr, suffix=''):
+    """
+    Loads an audio file as a mono signal resampled to `target_sr`.
+
+    `audio_file` may be a path or a seekable file-like object (e.g. a
+    BytesIO holding a downloaded MP3), so callers don't need to write the
+    audio to disk first.
+
+    Decodes native-rate PCM with soundfile and resamples it with SciPy's
+    polyphase filter, which is much cheaper than librosa's default
+    high-quality resampler and plenty for peak picking. Formats soundfile
+    can't decode go through librosa (audioread) with the same resampler.
+    """
+    try:
+        y, native_sr = sf.read(audio_file, dtype='float32', always_2d=True)
+    except (sf.LibsndfileError, RuntimeError, TypeError):
+        if isinstance(audio_file, (str, os.PathLike)):
+            return librosa.load(audio_file, sr=target_sr, mono=True, res_type='polyphase')
+        # audioread can only open real files, so spill the buffer to tmpfs.
+        audio_file.seek(0)
+        with tempfile.NamedTemporaryFile(dir=SCRATCH_DIR, suffix=suffix) as temp_file:
+            shutil.copyfileobj(audio_file, temp_file)
+            temp_file.flush()
+            return librosa.load(temp_file.name, sr=target_sr, mono=True, res_type='polyphase')
+
+    y = y.mean(axis=1)
+    if native_sr != target_sr:
+        g = math.gcd(native_sr, target_sr)
+        y = resample_poly(y, up=target_sr // g, down=native_sr // g)
+    return y, target_sr
+
+def fingerprint_song(audio_file, name=None):
     """
     Generates a landmark-based fingerprint for a single audio file.
     
-    This function is mostly the same as your original, but it returns a
-    list of (hash, timestamp) tuples instead of a dictionary, which is
-    easier to process for database insertion.
+    The fingerprints are returned as two parallel NumPy arrays rather than
+    a list of tuples, so they can go to the database without building a
+    Python object per fingerprint.
     
     Args:
-        file_path (str): Path to the audio file.
+        audio_file (str or file-like): Path to the audio file, or an
+            in-memory file object with its contents.
+        name (str, optional): File name used for logging and for the
+            format hint. Defaults to the basename of `audio_file`, or of
+            its `name` attribute for file objects that have one.
         
     Returns:
-        list: A list of tuples, where each tuple is (hash, anchor_time).
-              Returns an empty list if an error occurs.
+        tuple: (hashes, anchor_times) arrays of equal length.
+               Both are empty if an error occurs.
     """
+    if name is None:
+        name = getattr(audio_file, 'name', audio_file)
+        name = os.path.basename(name) if isinstance(name, (str, os.PathLike)) else '<in-memory audio>'
     try:
-        TARGET_SR = 11025
         # loading song  
-        y, sr = librosa.load(file_path, sr=TARGET_SR)
+        y, sr = load_audio(audio_file, TARGET_SR, suffix=os.path.splitext(name)[1])
+        y = y.astype(np.float32, copy=False)
 
-        # fourier transformation
-        D = librosa.stft(y)
-        S_db = librosa.amplitude_to_db(np.abs(D), ref=np.max)
+        # fourier transformation (float32 in, complex64 out)
+        _, _, D = stft(y, window=STFT_WINDOW, nperseg=N_FFT, noverlap=N_FFT - HOP_LENGTH, return_onesided=True)
+        magnitude = np.abs(D)
+        peak_magnitude = magnitude.max()
+        if peak_magnitude == 0:
+            return _no_fingerprints()
+        S_db = 20 * np.log10(magnitude + 1e-10) - 20 * np.log10(peak_magnitude)
 
         neighborhood_size = 15
-        local_max = maximum_filter(S_db, footprint=np.ones((neighborhood_size, neighborhood_size)), mode='constant')
-        detected_peaks = (S_db == local_max)
         amplitude_threshold = -50.0
-        peaks = np.where((detected_peaks) & (S_db > amplitude_threshold))
+        # Scan the (frames, bins) view: it is the contiguous layout of the
+        # STFT output, and the peaks come back sorted by frame, then by
+        # frequency, which is the order the pairing kernel needs.
+        peak_frames, peak_bins = _find_peaks(np.ascontiguousarray(S_db.T), neighborhood_size, amplitude_threshold)
         
-        if not peaks[0].any():
-            return []
-
-        n_fft = (D.shape[0] - 1) * 2
-        peak_freqs_at_peaks = librosa.fft_frequencies(sr=sr, n_fft=n_fft)[peaks[0]]
-        peak_times = librosa.frames_to_time(frames=peaks[1], sr=sr, n_fft=n_fft)
-        peaks_list = list(zip(peak_times, peak_freqs_at_peaks))
-        sorted_peaks = sorted(peaks_list, key=lambda p: p[0])
-
-        fingerprints = []
-        TARGET_ZONE_START_TIME = 0.1
-        TARGET_ZONE_TIME_DURATION = 0.8
-        TARGET_ZONE_FREQ_WIDTH = 200
-
-        for i, anchor_peak in enumerate(sorted_peaks):
-            anchor_time, anchor_freq = anchor_peak
-            t_min = anchor_time + TARGET_ZONE_START_TIME
-            t_max = t_min + TARGET_ZONE_TIME_DURATION
-            f_min = anchor_freq - TARGET_ZONE_FREQ_WIDTH
-            f_max = anchor_freq + TARGET_ZONE_FREQ_WIDTH
-            
-            for j in range(i + 1, len(sorted_peaks)):
-                target_peak = sorted_peaks[j]
-                target_time, target_freq = target_peak
-                if target_time > t_max:
-                    break
-                if t_min <= target_time <= t_max and f_min <= target_freq <= f_max:
-                    time_delta = target_time - anchor_time
-                    h = hash((anchor_freq, target_freq, time_delta))
-                    fingerprints.append((h, anchor_time))
-        print(f"Generated {len(fingerprints)} fingerprints for {os.path.basename(file_path)}")
-        return fingerprints
+        if len(peak_frames) == 0:
+            return _no_fingerprints()
+
+        hashes, anchors = _pair_peaks(peak_frames, peak_bins.astype(np.int16),
+                                      ZONE_MIN_FRAMES, ZONE_MAX_FRAMES, ZONE_MAX_BINS,
+                                      FREQ_CODES, DT_CODES)
+
+        anchor_times = librosa.frames_to_time(frames=peak_frames[anchors], sr=sr, hop_length=HOP_LENGTH, n_fft=N_FFT)
+        print(f"Generated {len(hashes)} fingerprints for {name}")
+        return hashes, anchor_times
 
     except Exception as e:
-        print(f"Could not process {file_path}. Error: {e}")
-        return []
+        print(f"Could not process {name}. Error: {e}")
+        return _no_fingerprints()
+
+
+def _no_fingerprints():
+    """Empty (hashes, anchor_times) result of `fingerprint_song`."""
+    return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
 
 
 def generate_song_id():
@@ -103,180 +337,181 @@ def generate_song_id():
     uuid_part = str(uuid.uuid4())[:8].upper()
     return f"SONG_{date_part}_{uuid_part}"
 
-def insert_song_and_fingerprints(conn, file_path, batch_size=5000):
-    """Processes a single song and adds its fingerprints to the database in batches."""
+def insert_song_if_new(cursor, song_name):
+    """
+    Inserts a song record unless one with the same title already exists.
+
+    Uses a single round trip: the no-op DO UPDATE makes RETURNING yield the
+    existing row on conflict, and `xmax = 0` is only true for a row this
+    statement freshly inserted. Requires the UNIQUE (szsongtitle)
+    constraint from migrations/004_songs_unique_title.sql.
+
+    Returns:
+        tuple: (song_id, inserted)
+    """
+    cursor.execute("""
+        INSERT INTO cala_mdm_songs (
+            szsongid, szsongtitle, szcomposerid, szperformerid, 
+            bactive, szcreatedby, dtmcreated, dtmupdated
+        ) VALUES (%s, %s, %s, %s, %s, %s, NOW(), NOW())
+        ON CONFLICT (szsongtitle) DO UPDATE SET szsongtitle = EXCLUDED.szsongtitle
+        RETURNING szsongid, (xmax = 0) AS inserted
+        """, (generate_song_id(), song_name, "UNKNOWN", "UNKNOWN", True, "admin"))
+    return cursor.fetchone()
+
+# --- Bulk Fingerprint Insert ---
+PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\0" + struct.pack(">ii", 0, 0)  # signature, flags, header extension length
+PGCOPY_TRAILER = struct.pack(">h", -1)
+
+def build_fingerprint_copy_buffer(song_id, hashes, offset_times):
+    """
+    Encodes fingerprints as a PostgreSQL binary COPY stream.
+
+    Every row is (szSongID text, offSetTime float8, intHash int8). All rows
+    have the same byte layout, so they are laid out with a packed big-endian
+    NumPy record dtype and serialized in one `tobytes()` call instead of one
+    `struct.pack` per row.
+    """
+    song_id_bytes = song_id.encode("utf-8")
+    row_dtype = np.dtype([
+        ("field_count", ">i2"),
+        ("song_id_len", ">i4"), ("song_id", f"S{len(song_id_bytes)}"),
+        ("offset_len", ">i4"), ("offset", ">f8"),
+        ("hash_len", ">i4"), ("hash", ">i8"),
+    ])
+    rows = np.empty(len(hashes), dtype=row_dtype)
+    rows["field_count"] = 3
+    rows["song_id_len"] = len(song_id_bytes)
+    rows["song_id"] = song_id_bytes
+    rows["offset_len"] = 8
+    rows["offset"] = offset_times
+    rows["hash_len"] = 8
+    rows["hash"] = hashes
+
+    buf = io.BytesIO()
+    buf.write(PGCOPY_HEADER)
+    buf.write(rows.tobytes())
+    buf.write(PGCOPY_TRAILER)
+    buf.seek(0)
+    return buf
+
+def copy_fingerprints(cursor, song_id, hashes, offset_times, batch_size=5000):
+    """
+    Bulk inserts one song's fingerprints with binary COPY.
+
+    Falls back to execute_values if the server rejects the binary stream
+    (e.g. a column type that doesn't match float8/int8). The COPY runs in a
+    savepoint so the fallback can reuse the same transaction.
+    """
+    cursor.execute("SAVEPOINT fingerprint_copy")
     try:
-        song_name = os.path.basename(file_path).replace('.mp3', '')
-        cursor = conn.cursor()
+        cursor.copy_expert(
+            """COPY "CALA_MDM_FINGERPRINTS" ("szSongID", "offSetTime", "intHash") FROM STDIN WITH (FORMAT BINARY)""",
+            build_fingerprint_copy_buffer(song_id, hashes, offset_times)
+        )
+        cursor.execute("RELEASE SAVEPOINT fingerprint_copy")
+    except psycopg2.Error as copy_error:
+        print(f"Binary COPY failed ({copy_error}), falling back to execute_values...")
+        cursor.execute("ROLLBACK TO SAVEPOINT fingerprint_copy")
+        fingerprint_tuples = [(song_id, offset_time, hash_value) for hash_value, offset_time in zip(hashes.tolist(), offset_times.tolist())]
+        execute_values(
+            cursor,
+            """INSERT INTO "CALA_MDM_FINGERPRINTS" ("szSongID", "offSetTime", "intHash") VALUES %s""", 
+            fingerprint_tuples,
+            template=None,
+            page_size=batch_size
+        )
+
+def insert_song_and_fingerprints(cursor, file_path, batch_size=5000, fingerprints=None):
+    """
+    Processes a single song and adds its fingerprints to the database.
 
-        # Check if song already exists
-        cursor.execute("SELECT szsongid FROM cala_mdm_songs WHERE szsongtitle = %s", (song_name,))
-        result = cursor.fetchone()
+    Runs on the caller's cursor and never commits, so a whole batch of songs
+    can share one transaction. The song's work is wrapped in a savepoint:
+    if anything fails, only that song is rolled back and the batch goes on.
+
+    `fingerprints` takes a precomputed `fingerprint_song` result (e.g. from
+    a worker process); it is computed here when omitted.
+    """
+    song_name = os.path.basename(file_path).replace('.mp3', '')
+    cursor.execute("SAVEPOINT song_insert")
+    try:
+        # Insert song record, or find the existing one
+        song_id, inserted = insert_song_if_new(cursor, song_name)
 
-        if result:
+        if not inserted:
             print(f"'{song_name}' already exists in the database. Skipping.")
-            cursor.close()
-            return result[0]
+            cursor.execute("RELEASE SAVEPOINT song_insert")
+            return song_id
         
         print(f"Processing: {song_name}...")
-        song_id = generate_song_id()
-        
-        # Insert song record
-        insert_query = """
-        INSERT INTO cala_mdm_songs (
-            szsongid, 
-            szsongtitle, 
-            szcomposerid, 
-            szperformerid, 
-            bactive, 
-            szcreatedby, 
-            dtmcreated, 
-            dtmupdated
-        ) VALUES (
-            %s, %s, %s, %s, %s, %s, NOW(), NOW()
-        )
-        """
-        cursor.execute(insert_query, (song_id, song_name, "UNKNOWN", "UNKNOWN", True, "admin"))
-        conn.commit()  # Commit song insertion first
         print(f"✅ Song '{song_name}' inserted with ID: {song_id}")
 
         # Generate fingerprints
-        fingerprints = fingerprint_song(file_path)
+        if fingerprints is None:
+            fingerprints = fingerprint_song(file_path)
+        hashes, offset_times = fingerprints
 
-        if not fingerprints:
+        if len(hashes) == 0:
             print(f"No fingerprints generated for {song_name}. Nothing to add.")
-            cursor.close()
+            cursor.execute("RELEASE SAVEPOINT song_insert")
             return song_id
         
-        print(f"Inserting {len(fingerprints)} fingerprints in batches of {batch_size}...")
-        
-        # Prepare fingerprint data
-        fingerprint_tuples = [(song_id, float(offset_time), hash_value) for hash_value, offset_time in fingerprints]
-        
-        # SOLUTION 1: Use COPY FROM for maximum performance
-        try:
-            # Create a temporary file with the data
-            import tempfile
-            import csv
-            
-            with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.csv', newline='') as temp_file:
-                writer = csv.writer(temp_file)
-                for song_id_val, offset_time, hash_value in fingerprint_tuples:
-                    writer.writerow([song_id_val, offset_time, hash_value])
-                temp_filename = temp_file.name
-            
-            # Use COPY FROM for bulk insert
-            with open(temp_filename, 'r') as f:
-                cursor.copy_from(
-                    f, 
-                    'CALA_MDM_FINGERPRINTS', 
-                    columns=('szSongID', 'offSetTime', 'intHash'),
-                    sep=','
-                )
-            
-            # Clean up temporary file
-            os.unlink(temp_filename)
-            
-        except Exception as copy_error:
-            print(f"COPY FROM failed ({copy_error}), falling back to batch insert...")
-            
-            # SOLUTION 2: Batch insert fallback
-            total_batches = (len(fingerprint_tuples) + batch_size - 1) // batch_size
-            
-            fingerprint_query = """
-            INSERT INTO CALA_MDM_FINGERPRINTS (
-                "szSongID",
-                "offSetTime",
-                "intHash"
-            ) VALUES (%s, %s, %s)
-            """
-            
-            for i in range(0, len(fingerprint_tuples), batch_size):
-                batch = fingerprint_tuples[i:i + batch_size]
-                current_batch = (i // batch_size) + 1
-                
-                print(f"  Processing batch {current_batch}/{total_batches} ({len(batch)} records)...")
-                
-                cursor.executemany(fingerprint_query, batch)
-                conn.commit()  # Commit each batch
-                
-                # Optional: Add a small delay to prevent overwhelming the database
-                # time.sleep(0.1)
-        
-        conn.commit()  # Final commit
-        print(f"✅ All {len(fingerprint_tuples)} fingerprints inserted successfully!")
+        print(f"Inserting {len(hashes)} fingerprints using binary COPY...")
+        copy_fingerprints(cursor, song_id, hashes, offset_times, batch_size)
         
-        cursor.close()
+        cursor.execute("RELEASE SAVEPOINT song_insert")
+        print(f"✅ All {len(hashes)} fingerprints inserted successfully!")
         return song_id
 
     except psycopg2.Error as e:
         print(f"❌ Error inserting song and fingerprints: {e}")
-        conn.rollback()
-        if 'cursor' in locals():
-            cursor.close()
+        cursor.execute("ROLLBACK TO SAVEPOINT song_insert")
         return None
     except Exception as e:
         print(f"❌ Unexpected error: {e}")
-        conn.rollback()
-        if 'cursor' in locals():
-            cursor.close()
+        cursor.execute("ROLLBACK TO SAVEPOINT song_insert")
         return None
 
 
-# Alternative: Ultra-fast bulk insert using execute_values
-def insert_song_and_fingerprints_fast(conn, file_path, original_filename, batch_size=5000):
-    """Ultra-fast version using execute_values for bulk inserts."""
+# Alternative: Ultra-fast version for a single uploaded file
+def insert_song_and_fingerprints_fast(conn, audio_file, original_filename, batch_size=5000):
+    """
+    Ultra-fast version that streams fingerprints with binary COPY.
+
+    `audio_file` can be a path or an in-memory file object; the song title
+    always comes from `original_filename`.
+    """
     try:
         
         song_name = os.path.splitext(original_filename)[0]
         cursor = conn.cursor()
 
-        # Check if song already exists
-        cursor.execute("SELECT szsongid FROM cala_mdm_songs WHERE szsongtitle = %s", (song_name,))
-        result = cursor.fetchone()
+        # Insert song record, or find the existing one
+        song_id, inserted = insert_song_if_new(cursor, song_name)
 
-        if result:
+        if not inserted:
             print(f"'{song_name}' already exists in the database. Skipping.")
+            conn.commit()
             cursor.close()
-            return result[0]
+            return song_id
         
         print(f"Processing: {song_name}...")
-        song_id = generate_song_id()
-        
-        # Insert song record
-        insert_query = """
-        INSERT INTO cala_mdm_songs (
-            szsongid, szsongtitle, szcomposerid, szperformerid, 
-            bactive, szcreatedby, dtmcreated, dtmupdated
-        ) VALUES (%s, %s, %s, %s, %s, %s, NOW(), NOW())
-        """
-        cursor.execute(insert_query, (song_id, song_name, "UNKNOWN", "UNKNOWN", True, "admin"))
         conn.commit()
         print(f"✅ Song '{song_name}' inserted with ID: {song_id}")
 
         # Generate fingerprints
-        fingerprints = fingerprint_song(file_path)
-        if not fingerprints:
+        hashes, offset_times = fingerprint_song(audio_file, original_filename)
+        if len(hashes) == 0:
             print(f"No fingerprints generated for {song_name}.")
             cursor.close()
             return song_id
         
-        print(f"Inserting {len(fingerprints)} fingerprints using execute_values...")
-        
-        # Prepare data for execute_values
-        fingerprint_tuples = [(song_id, float(offset_time), hash_value) for hash_value, offset_time in fingerprints]
-        
-        # Use execute_values for ultra-fast bulk insert
-        execute_values(
-            cursor,
-            """INSERT INTO "CALA_MDM_FINGERPRINTS" ("szSongID", "offSetTime", "intHash") VALUES %s""", 
-            fingerprint_tuples,
-            template=None,
-            page_size=batch_size
-        )
+        print(f"Inserting {len(hashes)} fingerprints using binary COPY...")
+        copy_fingerprints(cursor, song_id, hashes, offset_times, batch_size)
         
         conn.commit()
-        print(f"✅ All {len(fingerprint_tuples)} fingerprints inserted successfully!")
+        print(f"✅ All {len(hashes)} fingerprints inserted successfully!")
         
         cursor.close()
         return song_id
@@ -288,6 +523,13 @@ def insert_song_and_fingerprints_fast(conn, file_path, original_filename, batch_
             cursor.close()
         return None
     
+def _init_fingerprint_worker():
+    """Runs once in every fingerprinting process of the pool."""
+    # The processes already use every core; numba's own threads on top of
+    # that would only oversubscribe them.
+    numba.set_num_threads(1)
+    warm_up_kernels()
+
 def process_multiple_mp3_files(conn, folder_path):
     """Process multiple MP3 files in a folder."""
     mp3_files = glob.glob(os.path.join(folder_path, "*.mp3"))
@@ -298,8 +540,27 @@ def process_multiple_mp3_files(conn, folder_path):
     
     print(f"Found {len(mp3_files)} MP3 files to process...")
     
-    for file_path in mp3_files:
-        insert_song_and_fingerprints(conn, file_path)
+    # One transaction for the whole folder: a single commit (and WAL flush)
+    # instead of one per song.
+    with conn:
+        with conn.cursor() as cursor:
+            # Fingerprints can be regenerated, so don't wait for the flush.
+            cursor.execute("SET LOCAL synchronous_commit = off")
+
+            # Skip known songs up front so no worker fingerprints them.
+            song_names = [os.path.basename(f).replace('.mp3', '') for f in mp3_files]
+            cursor.execute("SELECT szsongtitle FROM cala_mdm_songs WHERE szsongtitle = ANY(%s)", (song_names,))
+            existing = {row[0] for row in cursor.fetchall()}
+            for song_name in existing:
+                print(f"'{song_name}' already exists in the database. Skipping.")
+            pending = [f for f, name in zip(mp3_files, song_names) if name not in existing]
+
+            # Fingerprinting is CPU-bound and independent per song: fan it out
+            # over all cores and insert each result here as it comes back, in
+            # order, on the single database connection.
+            with ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=_init_fingerprint_worker) as executor:
+                for file_path, fingerprints in zip(pending, executor.map(fingerprint_song, pending)):
+                    insert_song_and_fingerprints(cursor, file_path, fingerprints=fingerprints)
 
 # Main execution
 if __name__ == "__main__":
@@ -309,7 +570,8 @@ if __name__ == "__main__":
     if conn:
         try:
             # Example: Process a single file
-            # insert_song_and_fingerprints(conn, "D:\\Berkas_Rizki\\Semester_7\\Magang\\songs\\Hindia\\Hindia - Rumah Ke Rumah.mp3")
+            # with conn, conn.cursor() as cursor:
+            #     insert_song_and_fingerprints(cursor, "D:\\Berkas_Rizki\\Semester_7\\Magang\\songs\\Hindia\\Hindia - Rumah Ke Rumah.mp3")
 
             # Example: Process all MP3 files in a folder
             process_multiple_mp3_files(conn, "D:\\Berkas_Rizki\\Semester_7\\Magang\\songs\\PayungTeduh")
@@ -317,7 +579,7 @@ if __name__ == "__main__":
             print("Processing completed!")
             
         finally:
-            conn.close()
-            print("Database connection closed.")
+            release_db(conn)
+            print("Database connection released.")
     else:
         print("Failed to connect to database. Exiting.")
@@ -4,6 +4,7 @@ import cloudinary.uploader
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 from pydantic import BaseModel
 
@@ -32,7 +33,8 @@ async def create_upload_file(data: UploadURL):
     Accepts the Cloudinary URL from the frontend and dispatches the background task.
     """
     try:
-        process_fingerprints.delay(data.file_url, data.original_filename)
+        # .delay() is a blocking round trip to Redis; keep it off the event loop.
+        await run_in_threadpool(process_fingerprints.delay, data.file_url, data.original_filename)
         
         return JSONResponse(
             status_code=202,
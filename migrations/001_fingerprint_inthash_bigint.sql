@@ -0,0 +1,14 @@
+-- Fingerprint hashes are bit-packed landmark keys (see
+-- fingerprint_logic._pair_peaks):
+--     (anchor_freq_code << 22) | (target_freq_code << 12) | time_delta_code
+-- They always fall in [0, 2^32), which does not fit int4, so store them as
+-- a plain 64-bit integer. No-op if the column is already BIGINT.
+--
+-- COMPATIBILITY BREAK: rows written before this layout hold Python hash()
+-- values of (freq, freq, delta) float tuples. Keys computed with the new
+-- layout can never match them. Run 001a_purge_legacy_fingerprints.sql
+-- next, and re-ingest the songs it lists. Any matcher must build its query
+-- keys with the same layout and parameters (11025 Hz, 2048-point STFT, hop
+-- 512), i.e. through fingerprint_logic.fingerprint_song, never hash().
+ALTER TABLE "CALA_MDM_FINGERPRINTS"
+    ALTER COLUMN "intHash" TYPE BIGINT;
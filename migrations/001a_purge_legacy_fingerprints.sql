@@ -0,0 +1,34 @@
+-- Removes songs fingerprinted with the legacy Python hash() keys; see the
+-- COMPATIBILITY BREAK note in 001_fingerprint_inthash_bigint.sql.
+--
+-- Bit-packed keys always fall in [0, 2^32), while legacy hash() values
+-- span the whole signed 64-bit range. A song with any key outside that
+-- range was therefore ingested with the old code. All of its fingerprints
+-- and its cala_mdm_songs row are deleted. Without the row, the next upload
+-- of the same title is not skipped as "already exists", and it is
+-- fingerprinted again with the current layout.
+--
+-- The first SELECT lists the titles to re-upload; save its output.
+-- Run this before 005_partition_fingerprints_by_hash.sql, so legacy rows
+-- are not copied into the partitions.
+BEGIN;
+
+CREATE TEMP TABLE legacy_songs ON COMMIT DROP AS
+    SELECT DISTINCT "szSongID" AS szsongid
+    FROM "CALA_MDM_FINGERPRINTS"
+    WHERE "intHash" < 0 OR "intHash" >= 4294967296;
+
+SELECT s.szsongid, s.szsongtitle
+FROM cala_mdm_songs s
+JOIN legacy_songs l ON l.szsongid = s.szsongid
+ORDER BY s.szsongtitle;
+
+DELETE FROM "CALA_MDM_FINGERPRINTS" f
+USING legacy_songs l
+WHERE f."szSongID" = l.szsongid;
+
+DELETE FROM cala_mdm_songs s
+USING legacy_songs l
+WHERE s.szsongid = l.szsongid;
+
+COMMIT;
@@ -0,0 +1,13 @@
+-- Match queries look fingerprints up by "intHash" and only need the song
+-- and offset of each hit; INCLUDE makes those lookups index-only.
+--
+-- CREATE INDEX CONCURRENTLY cannot run inside a transaction block, so run
+-- this file with autocommit (e.g. plain `psql -f`), not wrapped in BEGIN.
+-- The column was widened to BIGINT by 001_fingerprint_inthash_bigint.sql.
+SET maintenance_work_mem = '1GB';
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_fp_hash
+    ON "CALA_MDM_FINGERPRINTS" ("intHash")
+    INCLUDE ("szSongID", "offSetTime");
+
+RESET maintenance_work_mem;
@@ -0,0 +1,15 @@
+-- Fingerprints are derived data: every row can be regenerated from the
+-- song audio. Skip the WAL for them so ingest only writes each page once.
+--
+-- Caveats of an UNLOGGED table:
+--   * it is truncated during crash recovery, and
+--   * it is not copied to streaming replicas.
+-- After a crash, songs whose fingerprints were lost can be found with
+--   SELECT s.szsongid FROM cala_mdm_songs s
+--   WHERE NOT EXISTS (SELECT 1 FROM "CALA_MDM_FINGERPRINTS" f
+--                     WHERE f."szSongID" = s.szsongid);
+-- and re-ingested after deleting their cala_mdm_songs rows.
+--
+-- SET UNLOGGED rewrites the table under an ACCESS EXCLUSIVE lock; run it
+-- while no ingest workers are active.
+ALTER TABLE "CALA_MDM_FINGERPRINTS" SET UNLOGGED;
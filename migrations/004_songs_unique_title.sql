@@ -0,0 +1,13 @@
+-- Song titles identify songs during ingest, which inserts them with
+-- INSERT ... ON CONFLICT (szsongtitle). That needs a unique constraint.
+-- Fails if duplicate titles already exist; remove those first.
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conname = 'uq_cala_mdm_songs_title'
+    ) THEN
+        ALTER TABLE cala_mdm_songs
+            ADD CONSTRAINT uq_cala_mdm_songs_title UNIQUE (szsongtitle);
+    END IF;
+END $$;
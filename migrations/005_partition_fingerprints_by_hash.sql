@@ -0,0 +1,265 @@
+-- Split the fingerprint table into 32 hash partitions on "intHash". Match
+-- queries can then scan partitions in parallel, and each partition keeps
+-- a smaller index.
+--
+-- Each partition is UNLOGGED, like the table it replaces
+-- (003_fingerprints_unlogged.sql). A partitioned parent cannot itself be
+-- UNLOGGED. Indexes on partitioned tables cannot be built CONCURRENTLY,
+-- so run this while ingest is stopped.
+--
+-- Run 001a_purge_legacy_fingerprints.sql first, so rows with legacy
+-- hash() keys are not copied into the partitions.
+--
+-- Rows are routed by PostgreSQL's own hash of "intHash" (hashint8), not by
+-- "intHash" % 32, so the ingest path keeps COPYing into the parent table.
+--
+-- What carries over to the new table:
+--   * columns, NOT NULL, defaults, CHECK constraints, identity, generated
+--     columns, storage settings and column comments, via LIKE ... INCLUDING
+--     ALL. Identity sequences are new and are advanced past max(id).
+--     Sequences owned by a serial column move to the new table.
+--   * the primary key, under the same name. A unique constraint on a
+--     partitioned table must contain the partition key, so "intHash" is
+--     appended to it (e.g. (id) becomes (id, "intHash")), which also makes
+--     "intHash" NOT NULL. Ids still come from one sequence, so they stay
+--     unique in practice.
+--   * outgoing foreign keys (e.g. "szSongID" -> cala_mdm_songs).
+--   * every other index, including idx_fp_hash from
+--     002_fingerprint_hash_index.sql, rebuilt with the same name and
+--     definition. Creating it on the parent cascades it to every partition.
+--   * the owner, the table comment, table and column GRANTs, and row level
+--     security (ENABLE/FORCE and every policy). GRANTs are applied to the
+--     parent only; the partitions are meant to be reached through it.
+--
+-- What is not carried over: storage parameters (WITH (...)), which a
+-- partitioned parent cannot have. The transaction aborts before changing
+-- anything if the table has any of these, since they cannot be moved
+-- as-is and would silently keep pointing at the old table:
+--   * a unique index or exclusion constraint other than the primary key,
+--   * foreign keys from other tables referencing it,
+--   * user triggers,
+--   * views depending on it,
+--   * publication membership (e.g. Supabase realtime),
+--   * inheritance parents or children.
+--
+-- The old table is kept as "CALA_MDM_FINGERPRINTS_UNPARTITIONED", with its
+-- primary key and indexes renamed with an "_unpartitioned" suffix. Drop it
+-- once the new one is verified.
+BEGIN;
+
+SET LOCAL maintenance_work_mem = '1GB';
+
+DO $$
+DECLARE
+    old_table regclass := '"CALA_MDM_FINGERPRINTS"';
+    problem text;
+BEGIN
+    SELECT string_agg(format('%s: %s', kind, name), '; ') INTO problem
+    FROM (
+        SELECT 'table is already partitioned' AS kind, old_table::text AS name
+        FROM pg_class WHERE oid = old_table AND relkind = 'p'
+        UNION ALL
+        SELECT 'unique index', i.indexrelid::regclass::text
+        FROM pg_index i
+        WHERE i.indrelid = old_table AND i.indisunique AND NOT i.indisprimary
+        UNION ALL
+        SELECT 'exclusion constraint', conname::text
+        FROM pg_constraint WHERE conrelid = old_table AND contype = 'x'
+        UNION ALL
+        SELECT 'referencing foreign key', format('%s on %s', conname, conrelid::regclass)
+        FROM pg_constraint WHERE confrelid = old_table AND contype = 'f'
+        UNION ALL
+        SELECT 'trigger', tgname::text
+        FROM pg_trigger WHERE tgrelid = old_table AND NOT tgisinternal
+        UNION ALL
+        SELECT DISTINCT 'dependent view', r.ev_class::regclass::text
+        FROM pg_depend d
+        JOIN pg_rewrite r ON r.oid = d.objid
+        WHERE d.classid = 'pg_rewrite'::regclass
+          AND d.refobjid = old_table
+          AND r.ev_class <> old_table
+        UNION ALL
+        SELECT 'publication', p.pubname::text
+        FROM pg_publication_rel pr
+        JOIN pg_publication p ON p.oid = pr.prpubid
+        WHERE pr.prrelid = old_table
+        UNION ALL
+        SELECT 'inheritance', format('%s inherits %s', inhrelid::regclass, inhparent::regclass)
+        FROM pg_inherits WHERE inhrelid = old_table OR inhparent = old_table
+    ) AS problems;
+
+    IF problem IS NOT NULL THEN
+        RAISE EXCEPTION 'cannot partition %: %', old_table, problem
+            USING HINT = 'Drop or move these objects first; see the header of this migration.';
+    END IF;
+END $$;
+
+CREATE TABLE "CALA_MDM_FINGERPRINTS_PARTITIONED"
+    (LIKE "CALA_MDM_FINGERPRINTS" INCLUDING ALL EXCLUDING INDEXES)
+    PARTITION BY HASH ("intHash");
+
+DO $$
+BEGIN
+    FOR i IN 0..31 LOOP
+        EXECUTE format(
+            'CREATE UNLOGGED TABLE %I PARTITION OF "CALA_MDM_FINGERPRINTS_PARTITIONED" '
+            'FOR VALUES WITH (MODULUS 32, REMAINDER %s)',
+            'CALA_MDM_FINGERPRINTS_P' || i, i);
+    END LOOP;
+END $$;
+
+-- Generated columns are recomputed; identity values are copied as they are.
+DO $$
+DECLARE
+    columns text;
+BEGIN
+    SELECT string_agg(quote_ident(attname), ', ' ORDER BY attnum) INTO columns
+    FROM pg_attribute
+    WHERE attrelid = '"CALA_MDM_FINGERPRINTS"'::regclass
+      AND attnum > 0 AND NOT attisdropped AND attgenerated = '';
+
+    EXECUTE format(
+        'INSERT INTO "CALA_MDM_FINGERPRINTS_PARTITIONED" (%s) OVERRIDING SYSTEM VALUE '
+        'SELECT %s FROM "CALA_MDM_FINGERPRINTS"',
+        columns, columns);
+END $$;
+
+ALTER TABLE "CALA_MDM_FINGERPRINTS" RENAME TO "CALA_MDM_FINGERPRINTS_UNPARTITIONED";
+ALTER TABLE "CALA_MDM_FINGERPRINTS_PARTITIONED" RENAME TO "CALA_MDM_FINGERPRINTS";
+
+DO $$
+DECLARE
+    old_table regclass := '"CALA_MDM_FINGERPRINTS_UNPARTITIONED"';
+    new_table regclass := '"CALA_MDM_FINGERPRINTS"';
+    rec record;
+    key_columns text;
+BEGIN
+    -- Sequences: advance the new identity sequences, adopt serial ones.
+    FOR rec IN
+        SELECT attname FROM pg_attribute
+        WHERE attrelid = new_table AND attidentity <> ''
+    LOOP
+        EXECUTE format(
+            'SELECT setval(pg_get_serial_sequence(%L, %L), coalesce(max(%I), 0) + 1, false) FROM %s',
+            new_table, rec.attname, rec.attname, new_table);
+    END LOOP;
+
+    FOR rec IN
+        SELECT d.objid::regclass AS seq, a.attname
+        FROM pg_depend d
+        JOIN pg_class c ON c.oid = d.objid AND c.relkind = 'S'
+        JOIN pg_attribute a ON a.attrelid = d.refobjid AND a.attnum = d.refobjsubid
+        WHERE d.classid = 'pg_class'::regclass
+          AND d.refobjid = old_table
+          AND d.deptype = 'a'
+    LOOP
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY %s.%I', rec.seq, new_table, rec.attname);
+    END LOOP;
+
+    -- Primary key, extended with the partition key.
+    FOR rec IN
+        SELECT oid, conname, conkey FROM pg_constraint
+        WHERE conrelid = old_table AND contype = 'p'
+    LOOP
+        SELECT string_agg(quote_ident(a.attname), ', ' ORDER BY k.ord) INTO key_columns
+        FROM unnest(rec.conkey) WITH ORDINALITY AS k(attnum, ord)
+        JOIN pg_attribute a ON a.attrelid = old_table AND a.attnum = k.attnum;
+        IF NOT EXISTS (
+            SELECT 1 FROM pg_attribute
+            WHERE attrelid = old_table AND attname = 'intHash' AND attnum = ANY (rec.conkey)
+        ) THEN
+            key_columns := key_columns || ', "intHash"';
+        END IF;
+
+        EXECUTE format('ALTER TABLE %s RENAME CONSTRAINT %I TO %I',
+                       old_table, rec.conname, rec.conname || '_unpartitioned');
+        EXECUTE format('ALTER TABLE %s ADD CONSTRAINT %I PRIMARY KEY (%s)',
+                       new_table, rec.conname, key_columns);
+    END LOOP;
+
+    -- Outgoing foreign keys.
+    FOR rec IN
+        SELECT conname, pg_get_constraintdef(oid) AS definition FROM pg_constraint
+        WHERE conrelid = old_table AND contype = 'f'
+    LOOP
+        EXECUTE format('ALTER TABLE %s ADD CONSTRAINT %I %s',
+                       new_table, rec.conname, rec.definition);
+    END LOOP;
+
+    -- All remaining indexes; the preflight check ruled out unique ones.
+    FOR rec IN
+        SELECT c.relname, pg_get_indexdef(i.indexrelid) AS definition
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = old_table
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conindid = i.indexrelid)
+    LOOP
+        EXECUTE format('ALTER INDEX %I RENAME TO %I', rec.relname, rec.relname || '_unpartitioned');
+        EXECUTE format('CREATE INDEX %I ON %s %s',
+                       rec.relname, new_table, substring(rec.definition FROM ' USING .*$'));
+    END LOOP;
+
+    -- Owner and table comment.
+    FOR rec IN
+        SELECT pg_get_userbyid(relowner) AS owner, obj_description(oid, 'pg_class') AS comment
+        FROM pg_class WHERE oid = old_table
+    LOOP
+        EXECUTE format('ALTER TABLE %s OWNER TO %I', new_table, rec.owner);
+        FOR i IN 0..31 LOOP
+            EXECUTE format('ALTER TABLE %I OWNER TO %I', 'CALA_MDM_FINGERPRINTS_P' || i, rec.owner);
+        END LOOP;
+        IF rec.comment IS NOT NULL THEN
+            EXECUTE format('COMMENT ON TABLE %s IS %L', new_table, rec.comment);
+        END IF;
+    END LOOP;
+
+    -- Table and column GRANTs (the owner's own privileges come with ownership).
+    FOR rec IN
+        SELECT acl.privilege_type, acl.grantee, acl.is_grantable, NULL::name AS attname
+        FROM pg_class c, aclexplode(c.relacl) AS acl
+        WHERE c.oid = old_table AND acl.grantee <> c.relowner
+        UNION ALL
+        SELECT acl.privilege_type, acl.grantee, acl.is_grantable, a.attname
+        FROM pg_attribute a, aclexplode(a.attacl) AS acl
+        WHERE a.attrelid = old_table AND a.attacl IS NOT NULL
+    LOOP
+        EXECUTE format('GRANT %s%s ON %s TO %s%s',
+                       rec.privilege_type,
+                       CASE WHEN rec.attname IS NULL THEN '' ELSE format(' (%I)', rec.attname) END,
+                       new_table,
+                       CASE WHEN rec.grantee = 0 THEN 'PUBLIC' ELSE quote_ident(pg_get_userbyid(rec.grantee)) END,
+                       CASE WHEN rec.is_grantable THEN ' WITH GRANT OPTION' ELSE '' END);
+    END LOOP;
+
+    -- Row level security and its policies.
+    IF (SELECT relrowsecurity FROM pg_class WHERE oid = old_table) THEN
+        EXECUTE format('ALTER TABLE %s ENABLE ROW LEVEL SECURITY', new_table);
+    END IF;
+    IF (SELECT relforcerowsecurity FROM pg_class WHERE oid = old_table) THEN
+        EXECUTE format('ALTER TABLE %s FORCE ROW LEVEL SECURITY', new_table);
+    END IF;
+
+    FOR rec IN
+        SELECT polname,
+               CASE WHEN polpermissive THEN 'PERMISSIVE' ELSE 'RESTRICTIVE' END AS kind,
+               CASE polcmd WHEN 'r' THEN 'SELECT' WHEN 'a' THEN 'INSERT'
+                           WHEN 'w' THEN 'UPDATE' WHEN 'd' THEN 'DELETE' ELSE 'ALL' END AS command,
+               (SELECT string_agg(CASE WHEN r = 0 THEN 'PUBLIC' ELSE quote_ident(pg_get_userbyid(r)) END, ', ')
+                FROM unnest(polroles) AS r) AS roles,
+               pg_get_expr(polqual, polrelid) AS qual,
+               pg_get_expr(polwithcheck, polrelid) AS with_check
+        FROM pg_policy WHERE polrelid = old_table
+    LOOP
+        EXECUTE format('CREATE POLICY %I ON %s AS %s FOR %s TO %s%s%s',
+                       rec.polname, new_table, rec.kind, rec.command, rec.roles,
+                       CASE WHEN rec.qual IS NULL THEN '' ELSE format(' USING (%s)', rec.qual) END,
+                       CASE WHEN rec.with_check IS NULL THEN '' ELSE format(' WITH CHECK (%s)', rec.with_check) END);
+    END LOOP;
+END $$;
+
+-- Covering index for hash lookups, in case 002 was never applied.
+CREATE INDEX IF NOT EXISTS idx_fp_hash
+    ON "CALA_MDM_FINGERPRINTS" ("intHash")
+    INCLUDE ("szSongID", "offSetTime");
+
+COMMIT;
@@ -1,12 +1,13 @@
+import io
 import os
 import ssl
-import tempfile
+import numba
 import requests
-import shutil
 from celery import Celery
+from celery.signals import worker_process_init
 
 # Import your database and fingerprinting logic
-from fingerprint_logic import connect_to_db, insert_song_and_fingerprints_fast
+from fingerprint_logic import connect_to_db, release_db, insert_song_and_fingerprints_fast, warm_up_kernels
 
 # --- Celery Configuration ---
 # Heroku Redis requires special SSL settings
@@ -18,35 +19,40 @@ if redis_url.startswith('rediss://'):
 else:
     celery_app = Celery('tasks', broker=redis_url, backend=redis_url)
 
+# Each child compiles the numba kernels in worker_process_init. On a fresh
+# dyno there is no numba cache yet, so that takes seconds per child, and
+# longer with all -c 4 children compiling at once. Celery's default of 4 s
+# would kill them as failed to start.
+celery_app.conf.worker_proc_alive_timeout = 60
 
-def download_file_from_url(url: str, original_filename: str) -> str:
-    """Downloads a file and saves it to a temp path with the correct extension."""
-    response = requests.get(url, stream=True)
+
+@worker_process_init.connect
+def prepare_worker_process(**kwargs):
+    """Compiles (or loads) the fingerprinting kernels once per forked worker process."""
+    # The prefork pool already runs one child per core (-c in the Procfile);
+    # numba's own threads on top of that would only oversubscribe them.
+    numba.set_num_threads(1)
+    warm_up_kernels()
+
+def download_file_to_buffer(url: str) -> io.BytesIO:
+    """Downloads a file into memory, ready to be handed to the audio loader."""
+    # Songs are a few MB: read the body in one go instead of chunk by chunk.
+    response = requests.get(url, timeout=30)
     response.raise_for_status()
-    
-    # Get the file extension from the original filename
-    suffix = os.path.splitext(original_filename)[1]
-    
-    temp_file_descriptor, temp_path = tempfile.mkstemp(suffix=suffix)
-    with open(temp_path, 'wb') as f:
-        shutil.copyfileobj(response.raw, f)
-            
-    os.close(temp_file_descriptor)
-    return temp_path
+    return io.BytesIO(response.content)
 
 @celery_app.task
 def process_fingerprints(file_url, original_filename):
     """
     This is the background job. It does all the slow work.
     """
-    temp_local_path = None
     conn = None
     print(f"WORKER: Received job for {original_filename}")
     
     try:
-        # 1. Download the file from Cloudinary to a temporary local path
+        # 1. Download the file from Cloudinary into memory
         print("WORKER: Downloading file from Cloudinary...")
-        temp_local_path = download_file_from_url(file_url, original_filename)
+        audio_buffer = download_file_to_buffer(file_url)
         
         # 2. Connect to the database
         conn = connect_to_db()
@@ -54,8 +60,8 @@ def process_fingerprints(file_url, original_filename):
             raise Exception("WORKER: Database connection failed.")
             
         # 3. Run the heavy fingerprinting and database insertion logic
-        print(f"WORKER: Starting fingerprinting for {temp_local_path}...")
-        song_id = insert_song_and_fingerprints_fast(conn, temp_local_path, original_filename)
+        print(f"WORKER: Starting fingerprinting for {original_filename}...")
+        song_id = insert_song_and_fingerprints_fast(conn, audio_buffer, original_filename)
         
         if song_id:
             print(f"WORKER: Successfully processed and inserted song. ID: {song_id}")
@@ -70,7 +76,4 @@ def process_fingerprints(file_url, original_filename):
     finally:
         # 4. Clean up
         if conn:
-            conn.close()
-        if temp_local_path and os.path.exists(temp_local_path):
-            os.unlink(temp_local_path)
-            print(f"WORKER: Cleaned up temporary file: {temp_local_path}")
\ No newline at end of file
+            release_db(conn)
\ No newline at end of file